@@ -21,10 +21,11 @@ Usage:
 - [q]: Quit (saves state to .tree_state.json)
 """
 
-import argparse, curses, json, os, random, string, subprocess, sys, threading, time
-from functools import partial
+import argparse, curses, io, json, mmap, os, string, subprocess, sys, threading, time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache, partial
 from typing import Any, Dict, List, Optional, Tuple, Generator
-import tiktoken
 
 STATE_FILE = ".tree_state.json"
 SUCCESS_MESSAGE_DURATION = 1.0
@@ -45,10 +46,10 @@ ALLOWED_EXTENSIONS = [
     ".rs", ".swift", ".vb", ".fs", ".sql", ".html",
     ".htm", ".css", ".scss", ".sass", ".less", ".xml"
 ]
-COPY_FORMAT_PRESETS = {
-    "blocks": "{path}:\n\"\"\"\n{content}\n\"\"\"\n",
-    "lines": "{path}: {content}\n",
-    "raw": "{content}\n",
+COPY_FORMAT_BUILDERS = {
+    "blocks": lambda path, content: f'{path}:\n"""\n{content}\n"""\n',
+    "lines": lambda path, content: f"{path}: {content}\n",
+    "raw": lambda path, content: f"{content}\n",
 }
 SCROLL_SPEED = {"normal": 1, "accelerated": 5}
 MAX_TREE_DEPTH = 10
@@ -60,26 +61,150 @@ ANONYMIZED_PREFIXES = [
     "Tool", "Service", "Gateway", "Interface", "Connector", "Adapter"
 ]
 INPUT_TIMEOUT = 0.1
+MAX_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+MAX_TOKENIZE_BYTES = 1 << 20
+MAX_COPY_FILE_SIZE = 8 << 20
+TOKENIZE_CHUNK_CHARS = 1 << 16
+TEXT_PEEK_SIZE = 8192
+TEXT_CHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)))
 
-try:
-    ENCODING = tiktoken.encoding_for_model("gpt-4o")
-except KeyError:
-    print("Error: Model encoding not found.")
-    sys.exit(1)
+_ENCODING = None
+_ENCODING_LOCK = threading.Lock()
+
+def get_encoding() -> Any:
+    global _ENCODING
+    with _ENCODING_LOCK:
+        if _ENCODING is None:
+            import tiktoken
+            try:
+                _ENCODING = tiktoken.encoding_for_model("gpt-4o")
+            except KeyError:
+                print("Error: Model encoding not found.")
+                sys.exit(1)
+    return _ENCODING
 
 def count_tokens(content: str) -> int:
-    return len(ENCODING.encode(content))
+    return len(get_encoding().encode_ordinary(content))
 
-def copy_text_to_clipboard(t: str) -> None:
+def count_tokens_batch(contents: List[str]) -> List[int]:
+    encoding = get_encoding()
     try:
-        if sys.platform.startswith("win"):
-            subprocess.Popen("clip", stdin=subprocess.PIPE, shell=True).communicate(input=t.encode("utf-16"))
-        elif sys.platform.startswith("darwin"):
-            subprocess.Popen("pbcopy", stdin=subprocess.PIPE).communicate(input=t.encode("utf-8"))
-        else:
-            subprocess.Popen(["xclip", "-selection", "clipboard"], stdin=subprocess.PIPE).communicate(input=t.encode("utf-8"))
-    except:
-        pass
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(contents, num_threads=os.cpu_count() or 1)]
+    except Exception:
+        return [len(encoding.encode_ordinary(content)) for content in contents]
+
+def count_tokens_streaming(path: str) -> Optional[int]:
+    # Tokenize in fixed-size chunks so oversized files never sit in memory
+    # whole. A chunk boundary can split one token, so the result may be off
+    # by a token per chunk — irrelevant at this file size.
+    encoding = get_encoding()
+    total = 0
+    try:
+        with open(path, "rb") as f:
+            if not peek_is_text(f.read(TEXT_PEEK_SIZE)):
+                return None
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            while True:
+                chunk = f.read(TOKENIZE_CHUNK_CHARS)
+                if not chunk:
+                    break
+                total += len(encoding.encode_ordinary(chunk))
+    except OSError:
+        return None
+    return total
+
+def peek_is_text(buf: bytes) -> bool:
+    if not buf:
+        return True
+    if b"\x00" in buf:
+        return False
+    return len(buf.translate(None, TEXT_CHARS)) / len(buf) <= 0.30
+
+def read_file_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            peek = f.read(TEXT_PEEK_SIZE)
+            if not peek_is_text(peek):
+                return None
+            data = peek + f.read() if len(peek) == TEXT_PEEK_SIZE else peek
+        return data.decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+_CLIPBOARD_CMD: Optional[Tuple[List[str], str]] = None
+# Tools that spawned but exited nonzero (e.g. wl-copy without a Wayland
+# display); skipped on the next probe so copies fall through to the next
+# candidate instead of "succeeding" with an empty clipboard.
+_CLIPBOARD_FAILED: set = set()
+
+if sys.platform.startswith("win"):
+    _CLIPBOARD_CANDIDATES = [(["clip"], "utf-16")]
+    _CLIPBOARD_SPAWN_KWARGS = {"creationflags": subprocess.CREATE_NO_WINDOW}
+elif sys.platform.startswith("darwin"):
+    _CLIPBOARD_CANDIDATES = [(["pbcopy"], "utf-8")]
+    _CLIPBOARD_SPAWN_KWARGS = {}
+else:
+    _CLIPBOARD_CANDIDATES = [
+        (["wl-copy"], "utf-8"),
+        (["xclip", "-selection", "clipboard"], "utf-8"),
+        (["xsel", "-b", "-i"], "utf-8"),
+    ]
+    _CLIPBOARD_SPAWN_KWARGS = {}
+
+def _win_set_clipboard(text: str) -> bool:
+    import ctypes
+    from ctypes import wintypes
+    CF_UNICODETEXT, GMEM_MOVEABLE = 13, 0x0002
+    user32, kernel32 = ctypes.windll.user32, ctypes.windll.kernel32
+    # Without explicit signatures ctypes assumes 32-bit int returns, which
+    # truncates HGLOBAL/LPVOID above 4 GiB on Win64 and corrupts memory.
+    kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+    kernel32.GlobalAlloc.argtypes = (wintypes.UINT, ctypes.c_size_t)
+    kernel32.GlobalLock.restype = wintypes.LPVOID
+    kernel32.GlobalLock.argtypes = (wintypes.HGLOBAL,)
+    kernel32.GlobalUnlock.restype = wintypes.BOOL
+    kernel32.GlobalUnlock.argtypes = (wintypes.HGLOBAL,)
+    kernel32.GlobalFree.restype = wintypes.HGLOBAL
+    kernel32.GlobalFree.argtypes = (wintypes.HGLOBAL,)
+    user32.OpenClipboard.argtypes = (wintypes.HWND,)
+    user32.SetClipboardData.restype = wintypes.HANDLE
+    user32.SetClipboardData.argtypes = (wintypes.UINT, wintypes.HANDLE)
+    data = text.encode("utf-16-le") + b"\x00\x00"
+    if not user32.OpenClipboard(None):
+        return False
+    try:
+        user32.EmptyClipboard()
+        handle = kernel32.GlobalAlloc(GMEM_MOVEABLE, len(data))
+        if not handle:
+            return False
+        pointer = kernel32.GlobalLock(handle)
+        if not pointer:
+            kernel32.GlobalFree(handle)
+            return False
+        ctypes.memmove(pointer, data, len(data))
+        kernel32.GlobalUnlock(handle)
+        if not user32.SetClipboardData(CF_UNICODETEXT, handle):
+            kernel32.GlobalFree(handle)
+            return False
+        return True
+    finally:
+        user32.CloseClipboard()
+
+_NATIVE_CLIPBOARD = _win_set_clipboard if sys.platform.startswith("win") else None
+
+def open_clipboard_proc() -> Tuple[Optional[subprocess.Popen], str]:
+    global _CLIPBOARD_CMD
+    candidates = [_CLIPBOARD_CMD] if _CLIPBOARD_CMD else _CLIPBOARD_CANDIDATES
+    for cmd, encoding in candidates:
+        if tuple(cmd) in _CLIPBOARD_FAILED:
+            continue
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, **_CLIPBOARD_SPAWN_KWARGS)
+        except (OSError, subprocess.SubprocessError):
+            continue
+        _CLIPBOARD_CMD = (cmd, encoding)
+        return proc, encoding
+    return None, ""
 
 def strike(text: str) -> str:
     return '\u0336' + text + '\u0336'
@@ -88,32 +213,56 @@ class FileFilter:
     def __init__(self, ignored_patterns: List[str], allowed_extensions: List[str]):
         self.ignored_patterns = ignored_patterns
         self.allowed_extensions = allowed_extensions
+        self._exact = frozenset(ignored_patterns)
+        self._allowed = frozenset(e.lower() for e in allowed_extensions)
+        # Single-lookup verdict per extension; ignored extensions win overlaps
+        self._verdict = {ext: False for ext in self._allowed}
+        self._verdict.update({p.lower(): True for p in ignored_patterns if p.startswith(".")})
 
     def is_ignored(self, name: str) -> bool:
-        if any(p in name for p in self.ignored_patterns):
+        # rfind beats os.path.splitext here; dot > 0 keeps dotfiles ext-less
+        dot = name.rfind(".")
+        ext = name[dot:].lower() if dot > 0 else ""
+        verdict = self._verdict.get(ext)
+        if verdict is not None:
+            return verdict or name in self._exact
+        if ext and self._allowed:
             return True
-        _, ext = os.path.splitext(name)
-        return bool(self.allowed_extensions and ext and ext.lower() not in self.allowed_extensions)
+        return name in self._exact
 
 class TreeNode:
+    __slots__ = (
+        "path", "is_dir", "expanded", "original_name", "display_name", "render_name",
+        "_sort_key", "anonymized", "disabled", "children", "token_count", "mtime_ns",
+        "size", "visible_count", "parent", "loaded", "_cached_stat", "_cached_content",
+    )
+
     def __init__(self, path: str, is_dir: bool, parent: Optional['TreeNode'] = None):
         self.path = path
         self.is_dir = is_dir
         self.expanded = False if is_dir else None
-        self.original_name = os.path.basename(path)
+        # Interned: directory names repeat constantly across big trees
+        self.original_name = sys.intern(os.path.basename(path))
         self.display_name = self.original_name
         self.render_name = self.original_name
+        self._sort_key = (not is_dir, self.original_name.lower())
         self.anonymized = False
         self.disabled = False if not is_dir else None
         self.children: List['TreeNode'] = []
         self.token_count: int = 0
+        self.mtime_ns: int = 0
+        self.size: int = 0
+        self.visible_count: int = 1
         self.parent = parent
+        self.loaded = True
+        self._cached_stat: Optional[Tuple[int, int]] = None
+        self._cached_content: Optional[str] = None
 
     def add_child(self, child: 'TreeNode') -> None:
         self.children.append(child)
 
     def sort_children(self) -> None:
-        self.children.sort(key=lambda x: (not x.is_dir, x.display_name.lower()))
+        self.children.sort(key=lambda x: x._sort_key)
 
     def calculate_token_count(self) -> int:
         if not self.is_dir:
@@ -122,184 +271,442 @@ class TreeNode:
         return self.token_count
 
     def update_token_count(self, delta: int) -> None:
-        self.token_count += delta
-        if self.parent:
-            self.parent.update_token_count(delta)
+        # A collapsed dir contributes 0 upward, so a delta landing inside
+        # one must stop at that boundary (mirrors propagate_visible_delta);
+        # the next expand re-adds the subtree total in one piece.
+        node = self
+        node.token_count += delta
+        while node.expanded and node.parent is not None:
+            node = node.parent
+            node.token_count += delta
 
     def update_render_name(self) -> None:
         self.render_name = self.display_name if self.is_dir else (strike(self.display_name) if self.disabled else self.display_name)
 
-def build_tree(root_path: str, file_filter: FileFilter, path_to_node: Dict[str, TreeNode], lock: threading.Lock) -> TreeNode:
-    root = TreeNode(root_path, True)
-    root.expanded = True
-    with lock:
-        path_to_node[root_path] = root
+def populate_tree(root: TreeNode, file_filter: FileFilter, path_to_node: Dict[str, TreeNode], state: Dict[str, Any]) -> None:
+    pending: List[TreeNode] = []
+    visited: List[TreeNode] = []
 
-    def recurse(node: TreeNode, current_path: str, depth: int) -> bool:
+    def scan_dir(node: TreeNode, current_path: str, depth: int) -> List[Tuple[TreeNode, str, int]]:
+        # visited stays ancestor-before-descendant: children are only
+        # submitted after their parent has been appended here.
+        visited.append(node)
         if depth > MAX_TREE_DEPTH:
-            return False
+            return []
         try:
-            entries = sorted(os.listdir(current_path))
+            with os.scandir(current_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
         except PermissionError:
-            return False
-        has_children = False
+            return []
+        subdirs = []
         for entry in entries:
-            if file_filter.is_ignored(entry):
+            if file_filter.is_ignored(entry.name) or entry.is_symlink():
                 continue
-            full_path = os.path.join(current_path, entry)
-            is_dir = os.path.isdir(full_path)
+            full_path = entry.path
+            is_dir = entry.is_dir(follow_symlinks=False)
             child = TreeNode(full_path, is_dir, node)
             if is_dir:
-                if recurse(child, full_path, depth + 1):
-                    node.add_child(child)
+                node.add_child(child)
+                child_state = state.get(full_path)
+                if child_state is not None and child_state.get("expanded") is False:
+                    # Saved as collapsed: defer the whole subtree until the
+                    # user expands it (collapsed dirs contribute no tokens).
+                    child.loaded = False
                     path_to_node[full_path] = child
-                    has_children = True
+                else:
+                    subdirs.append((child, full_path, depth + 1))
             else:
                 try:
-                    with open(full_path, "r", encoding="utf-8") as f:
-                        child.token_count = count_tokens(f.read())
-                except:
-                    child.token_count = 0
-                if not child.disabled:
-                    node.update_token_count(child.token_count)
+                    st = entry.stat()
+                    child.mtime_ns, child.size = st.st_mtime_ns, st.st_size
+                except OSError:
+                    pass
+                cached = state.get(full_path, {})
+                if child.mtime_ns and cached.get("mtime_ns") == child.mtime_ns and cached.get("size") == child.size and "token_count" in cached:
+                    child.token_count = cached["token_count"]
+                elif child.size <= MAX_TOKENIZE_BYTES:
+                    pending.append(child)
                 node.add_child(child)
                 path_to_node[full_path] = child
-                has_children = True
-        if has_children:
-            node.sort_children()
-            return True
-        return False
+        return subdirs
 
-    recurse(root, root_path, 0)
+    with ThreadPoolExecutor(max_workers=MAX_READ_WORKERS) as executor:
+        futures = {executor.submit(scan_dir, root, root.path, 0)}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                for args in future.result():
+                    futures.add(executor.submit(scan_dir, *args))
+        if pending:
+            contents = list(executor.map(read_file_text, [node.path for node in pending]))
+    kept_dirs = set()
+    for node in reversed(visited):
+        node.children = [c for c in node.children if not c.is_dir or id(c) in kept_dirs or not c.loaded]
+        if node.children:
+            node.sort_children()
+            kept_dirs.add(id(node))
+    for node in visited:
+        if id(node) in kept_dirs and node is not root:
+            path_to_node[node.path] = node
+    if pending:
+        readable = [(node, content) for node, content in zip(pending, contents) if content is not None]
+        for (node, _), count in zip(readable, count_tokens_batch([content for _, content in readable])):
+            node.token_count = count
     root.calculate_token_count()
+    recalculate_visible_count(root)
+
+def build_tree(root_path: str, file_filter: FileFilter, path_to_node: Dict[str, TreeNode], lock: threading.Lock, state: Optional[Dict[str, Any]] = None) -> TreeNode:
+    root = TreeNode(root_path, True)
+    root.expanded = True
+    with lock:
+        path_to_node[root_path] = root
+    populate_tree(root, file_filter, path_to_node, state or {})
     return root
 
+def ensure_loaded(node: TreeNode, file_filter: FileFilter, path_to_node: Dict[str, TreeNode], state: Dict[str, Any]) -> None:
+    if node.loaded:
+        return
+    node.loaded = True
+    populate_tree(node, file_filter, path_to_node, state)
+    # Saved state is for the freshly created descendants; the node itself
+    # keeps whatever this session already changed (e.g. an anonymize).
+    snapshot = (node.expanded, node.anonymized, node.display_name)
+    apply_state(node, state)
+    node.expanded, node.anonymized, node.display_name = snapshot
+    node.update_render_name()
+
+def ensure_subtree_loaded(node: TreeNode, file_filter: FileFilter, path_to_node: Dict[str, TreeNode], state: Dict[str, Any]) -> None:
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        ensure_loaded(current, file_filter, path_to_node, state)
+        stack.extend(child for child in current.children if child.is_dir and not child.loaded)
+
+try:
+    import orjson
+    _state_dumps = orjson.dumps
+    _state_loads = orjson.loads
+except ImportError:
+    _state_dumps = lambda state: json.dumps(state, separators=(",", ":")).encode("utf-8")
+    _state_loads = json.loads
+
+# On-disk layout is columnar: one list per field instead of a dict per
+# node, which roughly halves the file and the encode/decode time. The
+# in-memory shape stays {path: {field: value}}.
+_STATE_COLUMNS = ("expanded", "anonymized", "anonymized_name", "disabled", "token_count", "mtime_ns", "size")
+
+def _state_to_columns(state: Dict[str, Any]) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {"format": 2, "paths": list(state)}
+    for column in _STATE_COLUMNS:
+        payload[column] = [entry.get(column) for entry in state.values()]
+    return payload
+
+def _columns_to_state(payload: Dict[str, Any]) -> Dict[str, Any]:
+    columns = [(column, payload.get(column) or []) for column in _STATE_COLUMNS]
+    state: Dict[str, Any] = {}
+    for i, path in enumerate(payload.get("paths") or []):
+        state[path] = {column: values[i] for column, values in columns if i < len(values) and values[i] is not None}
+    return state
+
 def load_state(file_path: str) -> Dict[str, Any]:
     if os.path.isfile(file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            with open(file_path, "rb") as f:
+                data = _state_loads(f.read())
+        except (OSError, ValueError):
             return {}
+        if isinstance(data, dict) and data.get("format") == 2:
+            return _columns_to_state(data)
+        # Older versions stored a dict per path; accept it as-is.
+        return data if isinstance(data, dict) else {}
     return {}
 
 def save_state(file_path: str, state: Dict[str, Any]) -> None:
+    payload = _state_dumps(_state_to_columns(state))
+    try:
+        with open(file_path, "rb") as f:
+            if f.read() == payload:
+                return
+    except OSError:
+        pass
+    tmp_path = file_path + ".tmp"
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(state, f, indent=2)
-    except IOError:
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, file_path)
+    except OSError:
         pass
 
 def apply_state(node: TreeNode, state: Dict[str, Any], is_root: bool = False) -> None:
-    if is_root:
-        node.expanded = True
-    else:
-        node_state = state.get(node.path, {})
-        if node.is_dir:
-            node.expanded = node_state.get("expanded", node.is_dir)
-            node.anonymized = node_state.get("anonymized", False)
-            node.display_name = node_state.get("anonymized_name", node.original_name) if node.anonymized else node.original_name
+    stack = deque([(node, is_root)])
+    while stack:
+        current, root_flag = stack.popleft()
+        if root_flag:
+            current.expanded = True
         else:
-            node.disabled = node_state.get("disabled", False)
-    node.update_render_name()
-    for child in node.children:
-        apply_state(child, state)
+            node_state = state.get(current.path, {})
+            if current.is_dir:
+                current.expanded = node_state.get("expanded", current.is_dir)
+                current.anonymized = node_state.get("anonymized", False)
+                current.display_name = node_state.get("anonymized_name", current.original_name) if current.anonymized else current.original_name
+            else:
+                current.disabled = node_state.get("disabled", False)
+        current.update_render_name()
+        stack.extendleft((child, False) for child in reversed(current.children))
     if node.is_dir:
         node.calculate_token_count()
+    recalculate_visible_count(node)
 
 def gather_state(node: TreeNode, state: Dict[str, Any], is_root: bool = False) -> None:
-    if is_root:
-        state[node.path] = {"expanded": True, "anonymized": node.anonymized, "anonymized_name": node.display_name if node.anonymized else None}
-    else:
-        if node.is_dir:
-            state[node.path] = {"expanded": node.expanded, "anonymized": node.anonymized, "anonymized_name": node.display_name if node.anonymized else None}
+    stack = deque([(node, is_root)])
+    while stack:
+        current, root_flag = stack.popleft()
+        if root_flag:
+            state[current.path] = {"expanded": True, "anonymized": current.anonymized, "anonymized_name": current.display_name if current.anonymized else None}
+        elif current.is_dir:
+            state[current.path] = {"expanded": current.expanded, "anonymized": current.anonymized, "anonymized_name": current.display_name if current.anonymized else None}
         else:
-            state[node.path] = {"disabled": node.disabled}
-    for child in node.children:
-        gather_state(child, state)
+            state[current.path] = {"disabled": current.disabled, "token_count": current.token_count, "mtime_ns": current.mtime_ns, "size": current.size}
+        stack.extendleft((child, False) for child in reversed(current.children))
+
+TREE_VERSION = 0
+
+def bump_tree_version() -> None:
+    global TREE_VERSION
+    TREE_VERSION += 1
+
+_ANONYMIZED_ALPHABET = string.ascii_uppercase + string.digits
 
 def generate_anonymized_name() -> str:
-    return random.choice(ANONYMIZED_PREFIXES) + "_" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
+    # One urandom read covers all five draws instead of five RNG calls
+    r = int.from_bytes(os.urandom(4), "little")
+    prefix = ANONYMIZED_PREFIXES[r % len(ANONYMIZED_PREFIXES)]
+    r //= len(ANONYMIZED_PREFIXES)
+    suffix = []
+    for _ in range(4):
+        suffix.append(_ANONYMIZED_ALPHABET[r % 36])
+        r //= 36
+    return prefix + "_" + "".join(suffix)
 
 def toggle_node(node: TreeNode) -> None:
     if node.is_dir:
         node.expanded = not node.expanded
+        delta = sum(child.visible_count for child in node.children)
+        if not node.expanded:
+            delta = -delta
+        node.visible_count += delta
+        propagate_visible_delta(node.parent, delta)
+        if node.parent:
+            node.parent.update_token_count(node.token_count if node.expanded else -node.token_count)
         node.update_render_name()
+        bump_tree_version()
 
 def anonymize_toggle(node: TreeNode) -> None:
     if node.is_dir:
         node.anonymized = not node.anonymized
         node.display_name = generate_anonymized_name() if node.anonymized else node.original_name
         node.update_render_name()
+        bump_tree_version()
 
 def set_subtree_expanded(node: TreeNode, expanded: bool) -> None:
-    if node.is_dir:
-        node.expanded = expanded
-        node.update_render_name()
-        for child in node.children:
-            set_subtree_expanded(child, expanded)
+    if not node.is_dir:
+        return
+    previous_count = node.visible_count
+    previous_contribution = node.token_count if node.expanded else 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.is_dir:
+            current.expanded = expanded
+            current.update_render_name()
+            stack.extend(current.children)
+    recalculate_visible_count(node)
+    propagate_visible_delta(node.parent, node.visible_count - previous_count)
+    node.calculate_token_count()
+    if node.parent:
+        node.parent.update_token_count((node.token_count if expanded else 0) - previous_contribution)
+    bump_tree_version()
 
 def toggle_subtree(node: TreeNode) -> None:
     if node.is_dir:
         set_subtree_expanded(node, not node.expanded)
 
 def anonymize_subtree(node: TreeNode) -> None:
-    if node.is_dir:
-        node.anonymized = not node.anonymized
-        node.display_name = generate_anonymized_name() if node.anonymized else node.original_name
-        node.update_render_name()
-        for child in node.children:
-            anonymize_subtree(child)
-
-def flatten_tree(node: TreeNode, depth: int = 0, ancestor_has_tokens: bool = False) -> Generator[Tuple[TreeNode, int, bool], None, None]:
-    show_tokens = False
-    if not ancestor_has_tokens and node.token_count > 0 and node.is_dir:
-        show_tokens = True
-        ancestor_has_tokens = True
-    yield (node, depth, show_tokens)
-    if node.is_dir and node.expanded:
+    if not node.is_dir:
+        return
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        current.anonymized = not current.anonymized
+        current.display_name = generate_anonymized_name() if current.anonymized else current.original_name
+        current.update_render_name()
+        stack.extend(child for child in current.children if child.is_dir)
+    bump_tree_version()
+
+def recalculate_visible_count(node: TreeNode) -> None:
+    order = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        order.append(current)
+        stack.extend(current.children)
+    for current in reversed(order):
+        if current.is_dir and current.expanded:
+            current.visible_count = 1 + sum(child.visible_count for child in current.children)
+        else:
+            current.visible_count = 1
+
+def propagate_visible_delta(node: Optional[TreeNode], delta: int) -> None:
+    while node is not None and node.expanded:
+        node.visible_count += delta
+        node = node.parent
+
+def remove_subtree(node: TreeNode, path_to_node: Dict[str, TreeNode]) -> None:
+    parent = node.parent
+    if parent:
+        parent.children.remove(node)
+        propagate_visible_delta(parent, -node.visible_count)
+        contribution = node.token_count if ((node.is_dir and node.expanded) or (not node.is_dir and not node.disabled)) else 0
+        if contribution:
+            parent.update_token_count(-contribution)
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        path_to_node.pop(current.path, None)
+        stack.extend(current.children)
+
+def node_at(root: TreeNode, index: int) -> Tuple[TreeNode, int, bool]:
+    node, depth, ancestor_has_tokens = root, 0, False
+    while True:
+        show_tokens = not ancestor_has_tokens and node.token_count > 0 and node.is_dir
+        if index == 0:
+            return node, depth, show_tokens
+        index -= 1
+        ancestor_has_tokens = ancestor_has_tokens or show_tokens
         for child in node.children:
-            yield from flatten_tree(child, depth + 1, ancestor_has_tokens)
+            if index < child.visible_count:
+                node, depth = child, depth + 1
+                break
+            index -= child.visible_count
+        else:
+            raise IndexError("visible index out of range")
+
+def iter_window(root: TreeNode, start: int, count: int) -> Generator[Tuple[TreeNode, int, bool], None, None]:
+    stack = deque([(root, 0, False)])
+    position = 0
+    while stack and count > 0:
+        node, depth, ancestor_has_tokens = stack.popleft()
+        if position + node.visible_count <= start:
+            position += node.visible_count
+            continue
+        show_tokens = not ancestor_has_tokens and node.token_count > 0 and node.is_dir
+        if position >= start:
+            yield (node, depth, show_tokens)
+            count -= 1
+        position += 1
+        if node.is_dir and node.expanded:
+            ancestor_has_tokens = ancestor_has_tokens or show_tokens
+            stack.extendleft((child, depth + 1, ancestor_has_tokens) for child in reversed(node.children))
+
+def read_node_for_copy(node: TreeNode) -> str:
+    try:
+        st = os.stat(node.path)
+    except OSError:
+        return "<Could not read file>"
+    if st.st_size > MAX_COPY_FILE_SIZE:
+        return "<File too large to copy>"
+    key = (st.st_mtime_ns, st.st_size)
+    if node._cached_stat == key and node._cached_content is not None:
+        return node._cached_content
+    try:
+        if st.st_size == 0:
+            content = ""
+        else:
+            with open(node.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                content = mm[:].decode("utf-8", errors="replace")
+    except (OSError, ValueError):
+        return "<Could not read file>"
+    node._cached_stat, node._cached_content = key, content
+    return content
 
 def collect_visible_files(node: TreeNode, path_mode: str) -> List[Tuple[str, str]]:
-    files = []
-    def recurse(nd: TreeNode, path: List[str]):
-        current_path = path + [nd.display_name]
+    pairs: List[Tuple[str, TreeNode]] = []
+    stack = [(node, node.display_name)]
+    while stack:
+        nd, rel_path = stack.pop()
         if nd.is_dir and nd.expanded:
-            for child in nd.children:
-                recurse(child, current_path)
+            # Parent path is carried pre-joined; no per-level list copies
+            stack.extend((child, rel_path + os.sep + child.display_name) for child in reversed(nd.children))
         elif not nd.is_dir and not nd.disabled:
-            display_path = os.path.join(*current_path) if path_mode == "relative" else nd.display_name
-            try:
-                with open(nd.path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            except:
-                content = "<Could not read file>"
-            files.append((display_path, content))
-    recurse(node, [])
-    return files
-
-def copy_files_subloop(stdscr: Any, files: List[Tuple[str, str]], fmt: str) -> str:
-    copied_text = []
+            pairs.append((rel_path if path_mode == "relative" else nd.display_name, nd))
+    if not pairs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_READ_WORKERS, len(pairs))) as executor:
+        contents = executor.map(read_node_for_copy, [nd for _, nd in pairs])
+    return [(display, content) for (display, _), content in zip(pairs, contents)]
+
+def copy_files_subloop(stdscr: Any, files: List[Tuple[str, str]], fmt: str) -> bool:
+    proc, buf = None, None
+    if _NATIVE_CLIPBOARD is None:
+        proc, encoding = open_clipboard_proc()
+        if proc is None:
+            return False
+        if encoding == "utf-16":
+            # Write the BOM once up front; per-block utf-16 would repeat it.
+            proc.stdin.write(b"\xff\xfe")
+            encoding = "utf-16-le"
+    else:
+        buf = io.StringIO()
     my, mx = stdscr.getmaxyx()
     total = len(files)
     progress_bar_length = max(10, mx - 30)
+    bar_fill = "#" * progress_bar_length
+    bar_rest = "-" * progress_bar_length
+    builder = COPY_FORMAT_BUILDERS.get(fmt, COPY_FORMAT_BUILDERS["blocks"])
+    last_draw = 0.0
+    ok = True
     for idx, (path, content) in enumerate(files, 1):
-        copied_text.append(
-            COPY_FORMAT_PRESETS.get(fmt, COPY_FORMAT_PRESETS["blocks"]).format(
-                path=path,
-                content=content or "<Could not read file>"
-            )
-        )
+        block = builder(path, content or "<Could not read file>")
+        if proc is not None:
+            try:
+                proc.stdin.write(block.encode(encoding))
+            except (OSError, ValueError):
+                ok = False
+                break
+        else:
+            buf.write(block)
+        now = time.monotonic()
+        if now - last_draw < 1 / 30 and idx != total:
+            continue
+        last_draw = now
         progress = int((idx / total) * progress_bar_length)
-        progress_bar = "#" * progress + "-" * (progress_bar_length - progress)
-        status = f"Copying {idx}/{total} files: [{progress_bar}]"
+        status = f"Copying {idx}/{total} files: [{bar_fill[:progress]}{bar_rest[progress:]}]"
         try:
-            stdscr.addstr(my - 1, 0, status[:mx-1], curses.color_pair(7))
+            stdscr.move(my - 1, 0)
+            stdscr.clrtoeol()
+            stdscr.addstr(my - 1, 0, status[:mx-1], PAIR_ATTRS[7])
         except curses.error:
             pass
         stdscr.refresh()
-    return ''.join(copied_text)
+    if proc is not None:
+        try:
+            proc.stdin.close()
+            if proc.wait() != 0:
+                ok = False
+        except (OSError, subprocess.SubprocessError):
+            ok = False
+        if not ok:
+            # The tool ran but failed; blacklist it and forget the cache so
+            # the next copy probes the remaining candidates.
+            global _CLIPBOARD_CMD
+            if _CLIPBOARD_CMD is not None:
+                _CLIPBOARD_FAILED.add(tuple(_CLIPBOARD_CMD[0]))
+            _CLIPBOARD_CMD = None
+        return ok
+    return ok and _NATIVE_CLIPBOARD(buf.getvalue())
+
+# Filled by init_colors; indexed by the pair numbers used in the renderer
+PAIR_ATTRS: List[int] = [0] * 8
 
 def init_colors() -> None:
     curses.start_color()
@@ -311,14 +718,12 @@ def init_colors() -> None:
     curses.init_pair(5, curses.COLOR_YELLOW, -1)  # Additional labels
     curses.init_pair(6, curses.COLOR_WHITE, curses.COLOR_BLUE)  # Success message
     curses.init_pair(7, curses.COLOR_WHITE, -1)    # General text and symbols
+    for pair in range(len(PAIR_ATTRS)):
+        PAIR_ATTRS[pair] = curses.color_pair(pair)
 
-def safe_addnstr(stdscr: Any, y: int, x: int, text: str, color: int) -> None:
-    max_y, max_x = stdscr.getmaxyx()
-    if 0 <= y < max_y and 0 <= x < max_x:
-        try:
-            stdscr.addnstr(y, x, text, max_x - x - 1, curses.color_pair(color))
-        except curses.error:
-            pass
+@lru_cache(maxsize=None)
+def row_leading(selected: bool, depth: int, marker: str) -> str:
+    return ("> " if selected else "  ") + "│  " * depth + marker
 
 def run_curses(
     stdscr: Any,
@@ -327,158 +732,197 @@ def run_curses(
     fmt: str,
     path_mode: str,
     tree_changed_flag: threading.Event,
-    lock: threading.Lock
+    lock: threading.Lock,
+    file_filter: FileFilter,
+    saved_state: Dict[str, Any]
 ) -> None:
     curses.curs_set(0)
     stdscr.nodelay(False)
     stdscr.keypad(True)
     curses.halfdelay(int(INPUT_TIMEOUT * 10))
     init_colors()
+    # Re-query the terminal size only on KEY_RESIZE. Installing our own
+    # SIGWINCH handler would clobber ncurses' and stop both the window
+    # resize and KEY_RESIZE delivery.
+    size_dirty = True
+    max_y = max_x = 0
     current_index, scroll_offset, shift_mode = 0, 0, False
     copying_success, success_message_time = False, 0.0
     step_normal, step_accel = SCROLL_SPEED["normal"], SCROLL_SPEED["accelerated"]
-    flattened_cache: List[Tuple[TreeNode, int, bool]] = []
-    tree_changed, total_tokens = True, root_node.token_count
+    cached_version, total_tokens = -1, root_node.token_count
+    dirty = True
+    prev_plans: List[Any] = []
+    prev_dims = (0, 0)
 
     while True:
         now = time.time()
         if copying_success and (now - success_message_time > SUCCESS_MESSAGE_DURATION):
             copying_success = False
+            dirty = True
         if tree_changed_flag.is_set():
+            tree_changed_flag.clear()
             with lock:
-                flattened_cache = list(flatten_tree(root_node))
-            tree_changed, tree_changed_flag.clear()
-            total_tokens = root_node.token_count
-        if tree_changed:
+                recalculate_visible_count(root_node)
+            bump_tree_version()
+        if TREE_VERSION != cached_version:
             with lock:
-                flattened_cache = list(flatten_tree(root_node))
-            tree_changed, total_tokens = False, root_node.token_count
-        max_y, max_x = stdscr.getmaxyx()
+                total_tokens = root_node.token_count
+            cached_version = TREE_VERSION
+            dirty = True
+        if size_dirty:
+            size_dirty = False
+            max_y, max_x = stdscr.getmaxyx()
+            dirty = True
         visible_lines = max_y - 1
-        with lock:
-            current_index = max(0, min(current_index, len(flattened_cache) - 1))
-        if current_index < scroll_offset:
-            scroll_offset = current_index
-        elif current_index >= scroll_offset + visible_lines:
-            scroll_offset = current_index - visible_lines + 1
-        stdscr.erase()
-        with lock:
-            for i in range(scroll_offset, min(scroll_offset + visible_lines, len(flattened_cache))):
-                node, depth, show_tokens = flattened_cache[i]
-                is_selected, y, x = (i == current_index), i - scroll_offset, 0
-                arrow = "> " if is_selected else "  "
-                safe_addnstr(stdscr, y, x, arrow, 0)
-                x += len(arrow)
-                prefix = "│  " * depth
-                safe_addnstr(stdscr, y, x, prefix, 0)
-                x += len(prefix)
-                
-                # Add improved expand/collapse symbols for directories in white
-                if node.is_dir:
-                    symbol = "▾ " if node.expanded else "▸ "
-                    symbol_color = 7  # White for symbols
-                    safe_addnstr(stdscr, y, x, symbol, symbol_color)
-                    x += len(symbol)
-                
-                # Set color based on node type
-                color = 2 if node.is_dir else (3 if node.disabled else 1)
-                safe_addnstr(stdscr, y, x, node.render_name, color)
-                x += len(node.render_name)
-                if show_tokens and node.token_count > 0:
-                    separator = " | "
-                    if x + len(separator) < max_x:
-                        safe_addnstr(stdscr, y, x, separator, 7)
-                        x += len(separator)
-                    tokens_label = "Tokens: "
-                    tokens_number = f"{node.token_count}"
-                    if x + len(tokens_label) < max_x:
-                        safe_addnstr(stdscr, y, x, tokens_label, 4)
-                        x += len(tokens_label)
-                    if x + len(tokens_number) < max_x:
-                        safe_addnstr(stdscr, y, x, tokens_number, 7)
-        if copying_success:
-            safe_addnstr(stdscr, max_y - 1, 0, "Successfully Copied to Clipboard".ljust(max_x), 6)
-        else:
-            labels = []
+        if dirty:
+            dirty = False
+            with lock:
+                visible_total = root_node.visible_count
+            current_index = max(0, min(current_index, visible_total - 1))
+            if current_index < scroll_offset:
+                scroll_offset = current_index
+            elif current_index >= scroll_offset + visible_lines:
+                scroll_offset = current_index - visible_lines + 1
+            # Build a draw plan per screen row: a tuple of (x, text, color)
+            # segments. Only rows whose plan changed since the last frame
+            # are rewritten, so navigation touches two lines, not max_y.
+            plans: List[Tuple[Tuple[int, str, int], ...]] = [() for _ in range(max_y)]
             with lock:
-                if flattened_cache:
-                    node, _, _ = flattened_cache[current_index]
-                    if node.is_dir:
-                        if shift_mode:
-                            labels.extend([("[E] Toggle All", 7), ("[A] " + ("Anonymize All" if not node.anonymized else "De-Anonymize All"), 7)])
+                window_rows = list(iter_window(root_node, scroll_offset, visible_lines))
+                for row_offset, (node, depth, show_tokens) in enumerate(window_rows):
+                    i = scroll_offset + row_offset
+                    is_selected, x = (i == current_index), 0
+                    segments = []
+                    # Arrow, indent and expand/collapse symbol share one white segment
+                    marker = ("▾ " if node.expanded else "▸ ") if node.is_dir else ""
+                    leading = row_leading(is_selected, depth, marker)
+                    segments.append((x, leading, 7))
+                    x += len(leading)
+                    color = 2 if node.is_dir else (3 if node.disabled else 1)
+                    segments.append((x, node.render_name, color))
+                    x += len(node.render_name)
+                    if show_tokens and node.token_count > 0:
+                        separator = " | "
+                        if x + len(separator) < max_x:
+                            segments.append((x, separator, 7))
+                            x += len(separator)
+                        tokens_label = "Tokens: "
+                        tokens_number = f"{node.token_count}"
+                        if x + len(tokens_label) < max_x:
+                            segments.append((x, tokens_label, 4))
+                            x += len(tokens_label)
+                        if x + len(tokens_number) < max_x:
+                            segments.append((x, tokens_number, 7))
+                    plans[row_offset] = tuple(segments)
+            if copying_success:
+                plans[max_y - 1] = ((0, "Successfully Copied to Clipboard".ljust(max_x), 6),)
+            else:
+                labels = []
+                with lock:
+                    # The watcher can shrink the tree between lock drops;
+                    # re-clamp before every node_at so the index is valid
+                    # for the tree as it is now.
+                    current_index = max(0, min(current_index, root_node.visible_count - 1))
+                    if root_node.visible_count > 0:
+                        node, _, _ = node_at(root_node, current_index)
+                        if node.is_dir:
+                            if shift_mode:
+                                labels.extend([("[E] Toggle All", 7), ("[A] " + ("Anonymize All" if not node.anonymized else "De-Anonymize All"), 7)])
+                            else:
+                                labels.extend([("[e] Toggle", 7), ("[a] " + ("Anonymize" if not node.anonymized else "De-Anonymize"), 7)])
                         else:
-                            labels.extend([("[e] Toggle", 7), ("[a] " + ("Anonymize" if not node.anonymized else "De-Anonymize"), 7)])
+                            labels.append(("[d] " + ("Enable" if node.disabled else "Disable"), 7))
+                        labels.append(("[c] Copy", 7))
                     else:
-                        labels.append(("[d] " + ("Enable" if node.disabled else "Disable"), 7))
-                    labels.append(("[c] Copy", 7))
-                else:
-                    labels.append(("No files to display.", 7))
-            with lock:
-                tokens_visible = any(
-                    show_tokens for _, _, show_tokens in flattened_cache[scroll_offset:scroll_offset + visible_lines]
-                )
-            if not tokens_visible:
-                if total_tokens > 0:
-                    labels.extend([("|", 7), ("Tokens:", 4), (str(total_tokens), 7)])
-                else:
-                    labels.extend([("|", 7), ("No tokens to copy.", 4)])
-            x_position = 0
-            for text, color in labels:
-                safe_addnstr(stdscr, max_y - 1, x_position, text, color)
-                x_position += len(text) + 2
-        stdscr.refresh()
+                        labels.append(("No files to display.", 7))
+                tokens_visible = any(show_tokens for _, _, show_tokens in window_rows)
+                if not tokens_visible:
+                    if total_tokens > 0:
+                        labels.extend([("|", 7), ("Tokens:", 4), (str(total_tokens), 7)])
+                    else:
+                        labels.extend([("|", 7), ("No tokens to copy.", 4)])
+                segments, x_position = [], 0
+                for text, color in labels:
+                    segments.append((x_position, text, color))
+                    x_position += len(text) + 2
+                plans[max_y - 1] = tuple(segments)
+            if (max_y, max_x) != prev_dims:
+                stdscr.erase()
+                prev_plans = [None] * max_y
+                prev_dims = (max_y, max_x)
+            for y, plan in enumerate(plans):
+                if plan == prev_plans[y]:
+                    continue
+                try:
+                    stdscr.move(y, 0)
+                    stdscr.clrtoeol()
+                except curses.error:
+                    pass
+                for x, text, color in plan:
+                    if 0 <= x < max_x:
+                        try:
+                            stdscr.addnstr(y, x, text, max_x - x - 1, PAIR_ATTRS[color])
+                        except curses.error:
+                            pass
+                prev_plans[y] = plan
+            stdscr.refresh()
         try:
             key = stdscr.getch()
         except KeyboardInterrupt:
             key = ord('q')
         if key == -1:
             continue
+        dirty = True
+        if key == curses.KEY_RESIZE:
+            size_dirty = True
+            continue
+        # shift_mode only picks which help labels show on the bottom bar
         shift_mode = True if 65 <= key <= 90 else False if 97 <= key <= 122 else shift_mode
-        step = step_accel if shift_mode else step_normal
-        if key in (ord("w"), ord("W")):
-            current_index = max(0, current_index - step)
-        elif key in (ord("s"), ord("S")):
-            current_index = min(len(flattened_cache) - 1, current_index + step)
+        if key in (ord("w"), ord("W"), ord("s"), ord("S")):
+            # Coalesce a held-key burst: drain queued repeats of the same
+            # key and apply them all before the next redraw, so a 50-key
+            # burst costs one frame instead of 50.
+            stdscr.nodelay(True)
+            repeats = 1
+            while True:
+                next_key = stdscr.getch()
+                if next_key != key:
+                    if next_key != -1:
+                        curses.ungetch(next_key)
+                    break
+                repeats += 1
+            stdscr.nodelay(False)
+            curses.halfdelay(int(INPUT_TIMEOUT * 10))
+            step = (step_accel if key in (ord("W"), ord("S")) else step_normal) * repeats
+            if key in (ord("w"), ord("W")):
+                current_index = max(0, current_index - step)
+            else:
+                current_index = min(visible_total - 1, current_index + step)
         elif key in (curses.KEY_ENTER, 10, 13):
             with lock:
-                node, _, _ = flattened_cache[current_index]
+                current_index = max(0, min(current_index, root_node.visible_count - 1))
+                node, _, _ = node_at(root_node, current_index)
                 if node.is_dir:
+                    ensure_loaded(node, file_filter, path_to_node, saved_state)
                     toggle_node(node)
-                    node.calculate_token_count()
-                    if node.parent:
-                        node.parent.calculate_token_count()
-                    tree_changed_flag.set()
-        elif shift_mode:
-            with lock:
-                node, _, _ = flattened_cache[current_index]
-                if node.is_dir:
-                    if key == ord("E"):
-                        toggle_subtree(node)
-                        node.calculate_token_count()
-                        if node.parent:
-                            node.parent.calculate_token_count()
-                        tree_changed_flag.set()
-                    elif key == ord("A"):
-                        anonymize_subtree(node)
-                        node.calculate_token_count()
-                        if node.parent:
-                            node.parent.calculate_token_count()
-                        tree_changed_flag.set()
         else:
             with lock:
-                node, _, _ = flattened_cache[current_index]
+                current_index = max(0, min(current_index, root_node.visible_count - 1))
+                node, _, _ = node_at(root_node, current_index)
                 if key == ord("e") and node.is_dir:
+                    ensure_loaded(node, file_filter, path_to_node, saved_state)
                     toggle_node(node)
-                    node.calculate_token_count()
-                    if node.parent:
-                        node.parent.calculate_token_count()
-                    tree_changed_flag.set()
+                elif key == ord("E") and node.is_dir:
+                    if not node.expanded:
+                        ensure_subtree_loaded(node, file_filter, path_to_node, saved_state)
+                    toggle_subtree(node)
                 elif key == ord("a") and node.is_dir:
                     anonymize_toggle(node)
-                    node.calculate_token_count()
-                    if node.parent:
-                        node.parent.calculate_token_count()
-                    tree_changed_flag.set()
+                elif key == ord("A") and node.is_dir:
+                    # Deferred descendants must exist for the toggle to
+                    # reach them; load before anonymizing.
+                    ensure_subtree_loaded(node, file_filter, path_to_node, saved_state)
+                    anonymize_subtree(node)
                 elif key == ord("d") and not node.is_dir:
                     previous_tokens = node.token_count if not node.disabled else 0
                     node.disabled = not node.disabled
@@ -487,15 +931,22 @@ def run_curses(
                     delta = new_tokens - previous_tokens
                     if node.parent:
                         node.parent.update_token_count(delta)
-                    tree_changed_flag.set()
+                    bump_tree_version()
                 elif key == ord("c"):
                     files_to_copy = collect_visible_files(node, path_mode)
             if key == ord("c") and files_to_copy:
-                copied_text = copy_files_subloop(stdscr, files_to_copy, fmt)
-                copy_text_to_clipboard(copied_text)
-                copying_success, success_message_time = True, time.time()
+                if copy_files_subloop(stdscr, files_to_copy, fmt):
+                    copying_success, success_message_time = True, time.time()
+                # The subloop drew its progress line outside the shadow
+                # buffer; invalidate the bottom row or a failed copy leaves
+                # the stale "Copying ..." text on screen.
+                if prev_plans:
+                    prev_plans[-1] = None
         if key in (ord("q"), ord("Q")):
-            state = {}
+            # Seed with the loaded state so never-expanded subtrees keep
+            # their saved entries — but drop paths gone from disk, or the
+            # file would accumulate dead entries forever.
+            state = {path: entry for path, entry in saved_state.items() if os.path.lexists(path)}
             with lock:
                 gather_state(root_node, state, is_root=True)
             save_state(STATE_FILE, state)
@@ -510,18 +961,54 @@ def calculate_token_counts(
 ) -> None:
     while True:
         with lock:
-            for node in path_to_node.values():
-                if not node.is_dir and node.token_count == 0 and not node.disabled:
-                    try:
-                        with open(node.path, "r", encoding="utf-8") as f:
-                            node.token_count = count_tokens(f.read())
-                    except:
-                        node.token_count = 0
-                    if node.parent:
-                        node.parent.update_token_count(node.token_count)
-            tree_changed_flag.set()
+            pending = [node for node in path_to_node.values() if not node.is_dir and node.token_count == 0 and not node.disabled]
+        small = [node for node in pending if node.size <= MAX_TOKENIZE_BYTES]
+        large = [node for node in pending if node.size > MAX_TOKENIZE_BYTES]
+        if pending:
+            # Read and tokenize without the lock; one batch call lets the
+            # BPE run across cores instead of crossing into Rust per file.
+            # Oversized files are streamed chunk by chunk instead of being
+            # loaded whole.
+            contents = [read_file_text(node.path) for node in small]
+            readable = [(node, content) for node, content in zip(small, contents) if content is not None]
+            counts = count_tokens_batch([content for _, content in readable]) if readable else []
+            results = [(node, count) for (node, _), count in zip(readable, counts)]
+            for node in large:
+                count = count_tokens_streaming(node.path)
+                if count is not None:
+                    results.append((node, count))
+            if results:
+                with lock:
+                    updated = False
+                    for node, count in results:
+                        if count and node.token_count == 0 and path_to_node.get(node.path) is node:
+                            node.token_count = count
+                            if not node.disabled and node.parent:
+                                node.parent.update_token_count(count)
+                            updated = True
+                if updated:
+                    tree_changed_flag.set()
         time.sleep(5)
 
+def dir_has_content(path: str, file_filter: FileFilter) -> bool:
+    stack = [(path, 0)]
+    while stack:
+        current, depth = stack.pop()
+        if depth > MAX_TREE_DEPTH:
+            continue
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if file_filter.is_ignored(entry.name) or entry.is_symlink():
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, depth + 1))
+                    else:
+                        return True
+        except OSError:
+            continue
+    return False
+
 def scan_filesystem(
     root_path: str,
     file_filter: FileFilter,
@@ -530,71 +1017,109 @@ def scan_filesystem(
     stop_event: threading.Event,
     lock: threading.Lock
 ) -> None:
-    previous_state = {}
-    with lock:
-        for path, node in path_to_node.items():
-            if not node.is_dir:
-                try:
-                    previous_state[path] = os.path.getmtime(path)
-                except:
-                    previous_state[path] = None
+    dir_mtimes: Dict[str, int] = {}
     while not stop_event.is_set():
-        current_state = {}
-        for dirpath, dirnames, filenames in os.walk(root_path):
-            dirnames[:] = [d for d in dirnames if not file_filter.is_ignored(d)]
-            for name in filenames:
-                if file_filter.is_ignored(name):
-                    continue
-                full_path = os.path.join(dirpath, name)
-                try:
-                    current_state[full_path] = os.path.getmtime(full_path)
-                except:
-                    current_state[full_path] = None
-        added = set(current_state.keys()) - set(previous_state.keys())
-        removed = set(previous_state.keys()) - set(current_state.keys())
-        modified = {path for path in current_state.keys() & previous_state.keys() if current_state[path] != previous_state[path]}
-        if added or removed or modified:
+        changed = False
+        # Structure pass: walk directories, but enumerate only those whose
+        # mtime moved — the kernel bumps it on create/delete/rename, so an
+        # unchanged directory costs one stat instead of a full listing.
+        stack = [root_path]
+        while stack:
+            directory = stack.pop()
+            try:
+                dir_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            if dir_mtimes.get(directory) == dir_mtime:
+                with lock:
+                    node = path_to_node.get(directory)
+                    subdirs = [child.path for child in node.children if child.is_dir] if node and node.is_dir else []
+                stack.extend(subdirs)
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    entries = [e for e in it if not file_filter.is_ignored(e.name) and not e.is_symlink()]
+            except OSError:
+                continue
+            dir_mtimes[directory] = dir_mtime
+            present: Dict[str, Any] = {}
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # Mirror populate_tree's keep-rule: a dir whose whole
+                    # subtree is ignored or empty never becomes a node.
+                    if dir_has_content(entry.path, file_filter):
+                        present[entry.path] = None
+                        stack.append(entry.path)
+                else:
+                    present[entry.path] = entry
             with lock:
-                for path in added:
-                    is_dir = os.path.isdir(path)
-                    parent_path = os.path.dirname(path)
-                    parent_node = path_to_node.get(parent_path)
-                    if parent_node and parent_node.is_dir and parent_node.expanded:
-                        new_node = TreeNode(path, is_dir, parent_node)
-                        if not is_dir:
+                parent_node = path_to_node.get(directory)
+                if parent_node is None or not parent_node.is_dir or not parent_node.loaded:
+                    continue
+                for node in [c for c in parent_node.children if c.path not in present]:
+                    remove_subtree(node, path_to_node)
+                    dir_mtimes.pop(node.path, None)
+                    changed = True
+                if parent_node.expanded:
+                    for path, entry in present.items():
+                        if path in path_to_node:
+                            continue
+                        new_node = TreeNode(path, entry is None, parent_node)
+                        if entry is None:
+                            # New dirs start collapsed, so the watcher never
+                            # attaches their contents; hand them to the
+                            # deferred-load path to populate on first expand.
+                            new_node.loaded = False
+                        else:
                             try:
-                                with open(path, "r", encoding="utf-8") as f:
-                                    new_node.token_count = count_tokens(f.read())
-                            except:
-                                new_node.token_count = 0
+                                st = entry.stat(follow_symlinks=False)
+                                new_node.mtime_ns, new_node.size = st.st_mtime_ns, st.st_size
+                            except OSError:
+                                pass
+                            if new_node.size <= MAX_TOKENIZE_BYTES:
+                                try:
+                                    with open(path, "r", encoding="utf-8") as f:
+                                        new_node.token_count = count_tokens(f.read())
+                                except (OSError, UnicodeDecodeError):
+                                    new_node.token_count = 0
                             if not new_node.disabled:
                                 parent_node.update_token_count(new_node.token_count)
                         parent_node.add_child(new_node)
                         parent_node.sort_children()
+                        propagate_visible_delta(parent_node, new_node.visible_count)
                         path_to_node[path] = new_node
-                for path in removed:
-                    node = path_to_node.get(path)
-                    if node:
-                        parent = node.parent
-                        if parent:
-                            parent.children.remove(node)
-                            if not node.is_dir and not node.disabled:
-                                parent.update_token_count(-node.token_count)
-                        del path_to_node[path]
-                for path in modified:
-                    node = path_to_node.get(path)
-                    if node and not node.is_dir and not node.disabled:
-                        try:
-                            with open(path, "r", encoding="utf-8") as f:
-                                new_count = count_tokens(f.read())
-                        except:
-                            new_count = 0
-                        delta = new_count - node.token_count
-                        node.token_count = new_count
-                        if node.parent:
-                            node.parent.update_token_count(delta)
+                        changed = True
+        # Content pass: directory mtimes do not move on file edits, so stat
+        # files directly — but only those whose parent is expanded.
+        with lock:
+            candidates = [node for node in path_to_node.values() if not node.is_dir and node.parent and node.parent.expanded and not node.disabled]
+        for node in candidates:
+            if stop_event.is_set():
+                break
+            try:
+                st = os.stat(node.path)
+            except OSError:
+                continue
+            if st.st_mtime_ns == node.mtime_ns:
+                continue
+            if st.st_size <= MAX_TOKENIZE_BYTES:
+                try:
+                    with open(node.path, "r", encoding="utf-8") as f:
+                        new_count = count_tokens(f.read())
+                except (OSError, UnicodeDecodeError):
+                    new_count = 0
+            else:
+                new_count = 0
+            with lock:
+                if path_to_node.get(node.path) is node:
+                    node.mtime_ns, node.size = st.st_mtime_ns, st.st_size
+                    delta = new_count - node.token_count
+                    node.token_count = new_count
+                    if delta and node.parent:
+                        node.parent.update_token_count(delta)
+            changed = True
+        if changed:
             tree_changed_flag.set()
-        previous_state = current_state
         time.sleep(1)
 
 def main() -> None:
@@ -606,12 +1131,13 @@ def main() -> None:
     if not os.path.isdir(args.directory):
         print(f"Error: '{args.directory}' is not a directory.")
         sys.exit(1)
+    threading.Thread(target=get_encoding, daemon=True).start()
     file_filter = FileFilter(IGNORED_PATTERNS, ALLOWED_EXTENSIONS)
     root_path = os.path.abspath(args.directory)
     path_to_node: Dict[str, TreeNode] = {}
     lock = threading.Lock()
-    root_node = build_tree(root_path, file_filter, path_to_node, lock)
     saved_state = load_state(STATE_FILE)
+    root_node = build_tree(root_path, file_filter, path_to_node, lock, saved_state)
     with lock:
         apply_state(root_node, saved_state, is_root=True)
     tree_changed_flag = threading.Event()
@@ -627,7 +1153,9 @@ def main() -> None:
                 fmt=args.copy_format,
                 path_mode=args.path_mode,
                 tree_changed_flag=tree_changed_flag,
-                lock=lock
+                lock=lock,
+                file_filter=file_filter,
+                saved_state=saved_state
             )
         )
     finally:
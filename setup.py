@@ -16,6 +16,7 @@ setup(
     ],
     extras_require={
         'token_counting': ['tiktoken'],
+        'fast_state': ['orjson'],
     },
     entry_points={
         'console_scripts': [